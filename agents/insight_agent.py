@@ -1,14 +1,76 @@
 from utils.insight_generation import generate_basic_insights
-from utils.visualization import create_time_series_plot, create_campaign_bar_plot, create_channel_pie_chart, create_correlation_heatmap, create_top_performers_chart
-from services.openai_service import OpenAIService
-import numpy as np
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+# Ratio metrics can't be summed across rows, so they are left out of aggregated charts
+_RATIO_METRICS = frozenset({'cpc', 'ctr', 'roi'})
+
+def build_visualization_spec(columns, dtypes, validation_result):
+    """
+    Build visualization specs from column names and dtypes only (no data access, so results can be cached)
+    """
+    visualizations = {}
+    metrics = validation_result["available_metrics"]
+    dimensions = set(validation_result["available_dimensions"])
+    non_ratio_metrics = [m for m in metrics if m not in _RATIO_METRICS]
+    
+    # Time series plot
+    if 'date' in dimensions:
+        if non_ratio_metrics:
+            visualizations['time_series'] = {
+                'metrics': non_ratio_metrics,
+                'default': non_ratio_metrics[0]
+            }
+    
+    # Campaign performance (top 10 only)
+    if 'campaign' in dimensions:
+        if non_ratio_metrics:
+            visualizations['campaign'] = {
+                'metrics': non_ratio_metrics,
+                'default': non_ratio_metrics[0],
+                'top_n': 10
+            }
+    
+    # Channel performance (top 10 only)
+    if {'source', 'medium'} <= dimensions:
+        if non_ratio_metrics:
+            visualizations['channel'] = {
+                'metrics': non_ratio_metrics,
+                'default': non_ratio_metrics[0],
+                'top_n': 10
+            }
+    
+    # Device performance (if available)
+    if 'device' in dimensions:
+        if metrics:
+            visualizations['device'] = {
+                'metrics': metrics,
+                'default': metrics[0],
+                'top_n': 8
+            }
+    
+    # Browser performance (if available)
+    if 'browser' in dimensions:
+        if metrics:
+            visualizations['browser'] = {
+                'metrics': metrics,
+                'default': metrics[0],
+                'top_n': 8
+            }
+    
+    # Correlation heatmap
+    numeric_cols = [c for c, dt in zip(columns, dtypes) if is_numeric_dtype(dt) and not is_bool_dtype(dt)]
+    if len(numeric_cols) > 1:
+        visualizations['correlation'] = True
+    
+    return visualizations
 
 class InsightAgent:
     def __init__(self):
         self.status = "Waiting for data validation"
-        self.openai_service = OpenAIService()
+        self.openai_service = None
+        self._api_key = None
     
-    def generate_insights(self, df, validation_result, depth="Moderate", use_ai=True):
+    def generate_insights(self, df, validation_result, depth="Moderate", use_ai=True, model=None, api_key=None):
         """
         Generate insights from the validated data
         """
@@ -16,7 +78,7 @@ class InsightAgent:
         
         if use_ai:
             # Use OpenAI for insight generation
-            insights = self.openai_service.generate_insights(df, validation_result, depth)
+            insights = self._ai_service(model, api_key).generate_insights(df, validation_result, depth)
         else:
             # Use basic statistical insights
             insights = generate_basic_insights(df, validation_result, depth)
@@ -24,64 +86,25 @@ class InsightAgent:
         self.status = "Insight generation complete"
         return insights
     
+    def stream_insights(self, df, validation_result, depth="Moderate", model=None, api_key=None):
+        """
+        Generate AI insights, yielding each one as soon as it has arrived
+        """
+        self.status = "Starting analysis..."
+        yield from self._ai_service(model, api_key).stream_insights(df, validation_result, depth)
+        self.status = "Insight generation complete"
+    
+    def _ai_service(self, model, api_key):
+        # The client and openai import are created on first use, and again whenever the model or API key changes
+        if (self.openai_service is None or api_key != self._api_key
+                or (model and self.openai_service.model != model)):
+            from services.openai_service import OpenAIService
+            self.openai_service = OpenAIService(model, api_key=api_key)
+            self._api_key = api_key
+        return self.openai_service
+    
     def create_visualizations(self, df, validation_result):
         """
         Create visualizations based on available data with top N items
         """
-        visualizations = {}
-        
-        # Time series plot
-        if 'date' in validation_result["available_dimensions"]:
-            time_metrics = [m for m in validation_result["available_metrics"] if m not in ['cpc', 'ctr', 'roi']]
-            if time_metrics:
-                visualizations['time_series'] = {
-                    'metrics': time_metrics,
-                    'default': time_metrics[0]
-                }
-        
-        # Campaign performance (top 10 only)
-        if 'campaign' in validation_result["available_dimensions"]:
-            campaign_metrics = [m for m in validation_result["available_metrics"] if m not in ['cpc', 'ctr', 'roi']]
-            if campaign_metrics:
-                visualizations['campaign'] = {
-                    'metrics': campaign_metrics,
-                    'default': campaign_metrics[0],
-                    'top_n': 10
-                }
-        
-        # Channel performance (top 10 only)
-        if all(d in validation_result["available_dimensions"] for d in ['source', 'medium']):
-            channel_metrics = [m for m in validation_result["available_metrics"] if m not in ['cpc', 'ctr', 'roi']]
-            if channel_metrics:
-                visualizations['channel'] = {
-                    'metrics': channel_metrics,
-                    'default': channel_metrics[0],
-                    'top_n': 10
-                }
-        
-        # Device performance (if available)
-        if 'device' in validation_result["available_dimensions"]:
-            device_metrics = validation_result["available_metrics"]
-            if device_metrics:
-                visualizations['device'] = {
-                    'metrics': device_metrics,
-                    'default': device_metrics[0],
-                    'top_n': 8
-                }
-        
-        # Browser performance (if available)
-        if 'browser' in validation_result["available_dimensions"]:
-            browser_metrics = validation_result["available_metrics"]
-            if browser_metrics:
-                visualizations['browser'] = {
-                    'metrics': browser_metrics,
-                    'default': browser_metrics[0],
-                    'top_n': 8
-                }
-        
-        # Correlation heatmap
-        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-        if len(numeric_cols) > 1:
-            visualizations['correlation'] = True
-        
-        return visualizations
\ No newline at end of file
+        return build_visualization_spec(tuple(df.columns), tuple(df.dtypes), validation_result)
\ No newline at end of file
@@ -1,16 +1,14 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 from io import BytesIO
-import re
+import hashlib
 
 # Import agents
 from agents.validation_agent import ValidationAgent
-from agents.insight_agent import InsightAgent
+from agents.insight_agent import InsightAgent, build_visualization_spec
 
 # Import utils
 from utils.data_validation import generate_sample_data
-from utils.visualization import create_time_series_plot, create_campaign_bar_plot, create_channel_pie_chart, create_correlation_heatmap, create_top_performers_chart
 
 # Set page configuration
 st.set_page_config(
@@ -70,7 +68,7 @@ st.markdown("""
 st.markdown('<h1 class="main-header">Marketing Insight Generator</h1>', unsafe_allow_html=True)
 st.markdown("""
 This multi-agent system analyzes your marketing data to generate actionable insights. 
-Upload your CSV or Excel file containing marketing metrics and dimensions.
+Upload your CSV, Excel or Parquet file containing marketing metrics and dimensions.
 """)
 
 # Initialize session state
@@ -84,6 +82,14 @@ if 'validation_result' not in st.session_state:
     st.session_state.validation_result = None
 if 'processed_df' not in st.session_state:
     st.session_state.processed_df = None
+if 'processed_sig' not in st.session_state:
+    st.session_state.processed_sig = None
+if 'file_sig' not in st.session_state:
+    st.session_state.file_sig = None
+if 'insights' not in st.session_state:
+    st.session_state.insights = None
+if 'insights_sig' not in st.session_state:
+    st.session_state.insights_sig = None
 
 # Initialize agents
 if 'validation_agent' not in st.session_state:
@@ -91,13 +97,152 @@ if 'validation_agent' not in st.session_state:
 if 'insight_agent' not in st.session_state:
     st.session_state.insight_agent = InsightAgent()
 
+def _viz():
+    # Deferred so plotly is only imported once a chart is actually drawn
+    import utils.visualization as viz
+    return viz
+
+def _df_fingerprint(df):
+    # Vectorized per-row hashes reduced to one digest; far cheaper than pickling the frame.
+    # hash_pandas_object ignores column names, so those (and dtypes) are folded in separately.
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    digest.update(repr((list(df.columns), [str(t) for t in df.dtypes])).encode())
+    return digest.hexdigest()
+
+# Cached pipeline stages (reused across reruns triggered by widget changes)
+@st.cache_data(show_spinner=False)
+def _load_df(file_bytes, name):
+    if name.endswith('.csv'):
+        # Multi-threaded Arrow parser. Only text columns stay Arrow-backed; numbers and dates convert
+        # to NumPy dtypes so reductions return nan (not pd.NA) and the numba/NumPy paths accept them
+        try:
+            import pyarrow as pa
+            import pyarrow.csv as pacsv
+            table = pacsv.read_csv(
+                BytesIO(file_bytes),
+                read_options=pacsv.ReadOptions(use_threads=True),
+                convert_options=pacsv.ConvertOptions(strings_can_be_null=True)
+            )
+            return table.to_pandas(
+                types_mapper=lambda t: pd.ArrowDtype(t) if pa.types.is_string(t) or pa.types.is_large_string(t) else None,
+                date_as_object=False,
+                self_destruct=True
+            )
+        except Exception:
+            return pd.read_csv(BytesIO(file_bytes))
+    elif name.endswith('.parquet'):
+        return pd.read_parquet(BytesIO(file_bytes), engine="pyarrow")
+    elif name.endswith('.feather'):
+        return pd.read_feather(BytesIO(file_bytes))
+    return pd.read_excel(BytesIO(file_bytes))
+
+@st.cache_data(show_spinner=False)
+def _sample_df():
+    return generate_sample_data()
+
+@st.cache_data(show_spinner=False)
+def _sample_files():
+    sample_df = _sample_df()
+    parquet_buf = BytesIO()
+    sample_df.to_parquet(parquet_buf, engine="pyarrow", compression="zstd")
+    return sample_df.to_csv(index=False).encode(), parquet_buf.getvalue()
+
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: _df_fingerprint})
+def _validate(_agent, df):
+    # Shallow copy so column normalization doesn't leak into the raw frame kept in session state
+    return _agent.process_data(df.copy(deep=False))
+
+@st.cache_data(show_spinner=False)
+def _build_viz_spec(_df, columns, dtypes_repr, validation_result):
+    # Keyed on column names and dtype strings; category dtypes themselves aren't hashable
+    return build_visualization_spec(columns, tuple(_df.dtypes), validation_result)
+
+# Figures are cached whole so reruns reuse the same figure instead of re-aggregating and rebuilding it.
+# They are keyed on the processed frame's fingerprint (computed once per validation) rather than
+# rehashing the frame itself on every call
+@st.cache_data(show_spinner=False)
+def _fig_time_series(df_sig, _df, metric):
+    return _viz().create_time_series_plot(_df, 'date', metric)
+
+@st.cache_data(show_spinner=False)
+def _fig_campaign(df_sig, _df, metric):
+    viz = _viz()
+    return viz.plot_campaign_bar(viz.aggregate_top_n(_df, 'campaign', metric, 10), 'campaign', metric)
+
+@st.cache_data(show_spinner=False)
+def _fig_channel(df_sig, _df, metric):
+    viz = _viz()
+    return viz.plot_channel_pie(viz.aggregate_top_n(_df, ['source', 'medium'], metric, 10), metric)
+
+@st.cache_data(show_spinner=False)
+def _fig_top_performers(df_sig, _df, dimension, metric, top_n):
+    viz = _viz()
+    return viz.plot_top_performers(viz.aggregate_top_n(_df, dimension, metric, top_n), dimension, metric, 'bar', top_n)
+
+@st.cache_data(show_spinner=False)
+def _fig_correlation(df_sig, _df):
+    viz = _viz()
+    return viz.plot_correlation_heatmap(viz.compute_correlation_matrix(_df))
+
+@st.cache_resource(ttl=3600)
+def _ai_insights_store():
+    # Completed AI insights shared across sessions, keyed by (df_hash, depth, model, api_key_hash).
+    # A cache miss streams the response into the page instead of blocking on it, so results are
+    # stored here once the stream has finished; failed calls (bad key, rate limit) never are
+    return {}
+
+def _insight_box(i, insight):
+    return f"""
+                        <div class="insight-box">
+                            <strong>Insight #{i}:</strong> {insight}
+                        </div>
+                        """
+
+# Visualization tabs; each is a fragment so changing its selectbox reruns only that tab
+@st.fragment
+def _time_series_tab(processed_df, processed_sig, metrics):
+    time_metric = st.selectbox(
+        "Select metric for time series", 
+        options=metrics,
+        key="time_metric"
+    )
+    st.plotly_chart(_fig_time_series(processed_sig, processed_df, time_metric), use_container_width=True, theme=None)
+
+@st.fragment
+def _campaign_tab(processed_df, processed_sig, metrics):
+    campaign_metric = st.selectbox(
+        "Select metric for campaign comparison", 
+        options=metrics,
+        key="campaign_metric"
+    )
+    st.plotly_chart(_fig_campaign(processed_sig, processed_df, campaign_metric), use_container_width=True, theme=None)
+
+@st.fragment
+def _channel_tab(processed_df, processed_sig, metrics):
+    channel_metric = st.selectbox(
+        "Select metric for channel analysis", 
+        options=metrics,
+        key="channel_metric"
+    )
+    st.plotly_chart(_fig_channel(processed_sig, processed_df, channel_metric), use_container_width=True, theme=None)
+
+@st.fragment
+def _top_performers_tab(processed_df, processed_sig, dimension, metrics):
+    metric = st.selectbox(
+        f"Select metric for {dimension} analysis", 
+        options=metrics,
+        key=f"{dimension}_metric"
+    )
+    st.plotly_chart(_fig_top_performers(processed_sig, processed_df, dimension, metric, 8), use_container_width=True, theme=None)
+
 # Sidebar for file upload and controls
 with st.sidebar:
     st.header("Data Upload")
     uploaded_file = st.file_uploader(
-        "Upload your marketing data (CSV or Excel)",
-        type=['csv', 'xlsx'],
-        help="File should contain marketing metrics like spends, costs, CPC, CTR, ROI, etc."
+        "Upload your marketing data (CSV, Excel, Parquet or Feather)",
+        type=['csv', 'xlsx', 'parquet', 'feather'],
+        help="File should contain marketing metrics like spends, costs, CPC, CTR, ROI, etc. Parquet files load fastest."
     )
     
     st.header("Configuration")
@@ -147,23 +292,34 @@ with st.sidebar:
         st.session_state.data_processed = False
         st.session_state.validation_result = None
         st.session_state.processed_df = None
+        st.session_state.file_sig = None
+        st.session_state.insights_sig = None
 
 # Main app logic
 if sample_data or uploaded_file is not None:
-    # Load data
+    # Only reload and revalidate when the input itself changes, not on every widget rerun
     if uploaded_file is not None:
-        try:
-            if uploaded_file.name.endswith('.csv'):
-                df = pd.read_csv(uploaded_file)
-            else:
-                df = pd.read_excel(uploaded_file)
-        except Exception as e:
-            st.error(f"Error reading file: {str(e)}")
-            st.stop()
+        file_sig = (uploaded_file.name, uploaded_file.size, uploaded_file.file_id)
     else:
-        df = generate_sample_data()
+        file_sig = ('__sample__',)
     
-    st.session_state.df = df
+    if st.session_state.file_sig != file_sig:
+        # Load data
+        if uploaded_file is not None:
+            try:
+                df = _load_df(uploaded_file.getvalue(), uploaded_file.name)
+            except Exception as e:
+                st.error(f"Error reading file: {str(e)}")
+                st.stop()
+        else:
+            df = _sample_df()
+        
+        st.session_state.df = df
+        st.session_state.file_sig = file_sig
+        st.session_state.validation_result = None
+        st.session_state.processed_df = None
+    
+    df = st.session_state.df
     
     # Display raw data
     with st.expander("View Raw Data"):
@@ -173,21 +329,17 @@ if sample_data or uploaded_file is not None:
     # Agent 1: Data Validation
     st.markdown('<h2 class="sub-header">Data Validation</h2>', unsafe_allow_html=True)
     
-    col1, col2 = st.columns([3, 1])
-    with col1:
-        validation_progress = st.progress(0)
-        status_text = st.empty()
-    
-    for i in range(101):
-        validation_progress.progress(i)
-        status_text.text(f"Agent 1: {st.session_state.validation_agent.status}")
-        if i == 100:
-            break
-    
     try:
-        validation_result, processed_df = st.session_state.validation_agent.process_data(df)
-        st.session_state.validation_result = validation_result
-        st.session_state.processed_df = processed_df
+        with st.status("Agent 1: Validating data...", expanded=False) as validation_status:
+            if st.session_state.processed_df is None:
+                validation_result, processed_df = _validate(st.session_state.validation_agent, df)
+                st.session_state.validation_result = validation_result
+                st.session_state.processed_df = processed_df
+                st.session_state.processed_sig = _df_fingerprint(processed_df)
+            validation_result = st.session_state.validation_result
+            processed_df = st.session_state.processed_df
+            processed_sig = st.session_state.processed_sig
+            validation_status.update(label="Agent 1: Validation complete", state="complete")
         
         # Double-check date conversion
         date_conversion_issue = False
@@ -226,23 +378,46 @@ if sample_data or uploaded_file is not None:
             # Agent 2: Insight Generation
             st.markdown('<h2 class="sub-header">Insight Generation</h2>', unsafe_allow_html=True)
             
-            insight_progress = st.progress(0)
-            insight_status = st.empty()
+            api_key_hash = hashlib.sha256((openai_api_key or "").encode()).hexdigest() if use_ai else None
+            insights_sig = (st.session_state.file_sig, insight_depth, use_ai, model_name if use_ai else None, api_key_hash)
             
-            for i in range(101):
-                insight_progress.progress(i)
-                insight_status.text(f"Agent 2: {st.session_state.insight_agent.status}")
-                if i == 100:
-                    break
-            
-            # Set OpenAI API key if provided
-            if use_ai and openai_api_key:
-                import os
-                os.environ['OPENAI_API_KEY'] = openai_api_key
-            
-            insights = st.session_state.insight_agent.generate_insights(
-                processed_df, validation_result, insight_depth, use_ai
-            )
+            live_insights = st.empty()
+            with st.status("Agent 2: Generating insights...", expanded=False) as insight_status:
+                if st.session_state.insights_sig != insights_sig:
+                    failed = False
+                    if use_ai:
+                        store = _ai_insights_store()
+                        store_key = (processed_sig, insight_depth, model_name, api_key_hash)
+                        insights = store.get(store_key)
+                        if insights is None:
+                            agent = st.session_state.insight_agent
+                            insights = []
+                            for insight in agent.stream_insights(
+                                processed_df, validation_result, insight_depth,
+                                model=model_name, api_key=openai_api_key or None
+                            ):
+                                insights.append(insight)
+                                live_insights.markdown(
+                                    "".join(_insight_box(i, x) for i, x in enumerate(insights, 1)),
+                                    unsafe_allow_html=True
+                                )
+                            live_insights.empty()
+                            if agent.openai_service.last_error is not None:
+                                # A stream that failed midway has yielded its earlier insights, so the
+                                # error is the last entry; the partial output is not kept as a result
+                                insights = [insights[-1]]
+                                failed = True
+                            else:
+                                store[store_key] = insights
+                    else:
+                        insights = st.session_state.insight_agent.generate_insights(
+                            processed_df, validation_result, insight_depth, use_ai
+                        )
+                    st.session_state.insights = insights
+                    # A failed call (rate limit, network) isn't remembered, so the next rerun retries it
+                    st.session_state.insights_sig = None if failed else insights_sig
+                insights = st.session_state.insights
+                insight_status.update(label="Agent 2: Insight generation complete", state="complete")
             
             # Display insights
             st.markdown("### Key Insights")
@@ -251,11 +426,7 @@ if sample_data or uploaded_file is not None:
                 for i, insight in enumerate(insights, 1):
                     insight = str(insight).strip()
                     if insight and insight != "None" and len(insight) > 10:
-                        st.markdown(f"""
-                        <div class="insight-box">
-                            <strong>Insight #{i}:</strong> {insight}
-                        </div>
-                        """, unsafe_allow_html=True)
+                        st.markdown(_insight_box(i, insight), unsafe_allow_html=True)
             else:
                 st.warning("""
                 No insights were generated. This could be because:
@@ -277,7 +448,9 @@ if sample_data or uploaded_file is not None:
             st.markdown("### Visualizations")
             
             # Get available visualizations
-            available_viz = st.session_state.insight_agent.create_visualizations(processed_df, validation_result)
+            available_viz = _build_viz_spec(
+                processed_df, tuple(processed_df.columns), tuple(str(t) for t in processed_df.dtypes), validation_result
+            )
             
             # Handle date conversion issues
             if date_conversion_issue and 'time_series' in available_viz:
@@ -306,69 +479,39 @@ if sample_data or uploaded_file is not None:
                 # Time series plot
                 if 'time_series' in available_viz:
                     with tabs[tab_idx]:
-                        time_metric = st.selectbox(
-                            "Select metric for time series", 
-                            options=available_viz['time_series']['metrics'],
-                            key="time_metric"
-                        )
-                        fig = create_time_series_plot(processed_df, 'date', time_metric)
-                        st.plotly_chart(fig, use_container_width=True)
+                        _time_series_tab(processed_df, processed_sig, available_viz['time_series']['metrics'])
                     tab_idx += 1
                 
                 # Campaign performance
                 if 'campaign' in available_viz:
                     with tabs[tab_idx]:
-                        campaign_metric = st.selectbox(
-                            "Select metric for campaign comparison", 
-                            options=available_viz['campaign']['metrics'],
-                            key="campaign_metric"
-                        )
-                        fig = create_campaign_bar_plot(processed_df, 'campaign', campaign_metric)
-                        st.plotly_chart(fig, use_container_width=True)
+                        _campaign_tab(processed_df, processed_sig, available_viz['campaign']['metrics'])
                     tab_idx += 1
                 
                 # Channel performance
                 if 'channel' in available_viz:
                     with tabs[tab_idx]:
-                        channel_metric = st.selectbox(
-                            "Select metric for channel analysis", 
-                            options=available_viz['channel']['metrics'],
-                            key="channel_metric"
-                        )
-                        fig = create_channel_pie_chart(processed_df, channel_metric)
-                        st.plotly_chart(fig, use_container_width=True)
+                        _channel_tab(processed_df, processed_sig, available_viz['channel']['metrics'])
                     tab_idx += 1
                 
                 # Device performance
                 if 'device' in available_viz:
                     with tabs[tab_idx]:
-                        device_metric = st.selectbox(
-                            "Select metric for device analysis", 
-                            options=available_viz['device']['metrics'],
-                            key="device_metric"
-                        )
-                        fig = create_top_performers_chart(processed_df, 'device', device_metric, 'bar', 8)
-                        st.plotly_chart(fig, use_container_width=True)
+                        _top_performers_tab(processed_df, processed_sig, 'device', available_viz['device']['metrics'])
                     tab_idx += 1
                 
                 # Browser performance
                 if 'browser' in available_viz:
                     with tabs[tab_idx]:
-                        browser_metric = st.selectbox(
-                            "Select metric for browser analysis", 
-                            options=available_viz['browser']['metrics'],
-                            key="browser_metric"
-                        )
-                        fig = create_top_performers_chart(processed_df, 'browser', browser_metric, 'bar', 8)
-                        st.plotly_chart(fig, use_container_width=True)
+                        _top_performers_tab(processed_df, processed_sig, 'browser', available_viz['browser']['metrics'])
                     tab_idx += 1
                 
                 # Correlation heatmap
                 if 'correlation' in available_viz:
                     with tabs[tab_idx]:
-                        fig = create_correlation_heatmap(processed_df)
+                        fig = _fig_correlation(processed_sig, processed_df)
                         if fig:
-                            st.plotly_chart(fig, use_container_width=True)
+                            st.plotly_chart(fig, use_container_width=True, theme=None)
                         else:
                             st.info("Not enough numeric data for correlation analysis.")
             else:
@@ -407,10 +550,10 @@ if sample_data or uploaded_file is not None:
 
 else:
     # Show instructions when no file is uploaded
-    st.info("👈 Please upload a CSV or Excel file using the sidebar, or check 'Use sample data' to try with demo data.")
+    st.info("👈 Please upload a CSV, Excel or Parquet file using the sidebar, or check 'Use sample data' to try with demo data.")
     
     # Sample data structure guidance
-with st.expander("What should my data structure look like?"):
+    with st.expander("What should my data structure look like?"):
         st.markdown("""
         Your marketing data should include these metrics and dimensions:
         
@@ -440,18 +583,26 @@ with st.expander("What should my data structure look like?"):
         """)
         
         # Show sample data
-        sample_df = generate_sample_data()
+        sample_df = _sample_df()
         st.write("Sample data structure:")
         st.dataframe(sample_df.head(10))
         
         # Download sample data
-        csv = sample_df.to_csv(index=False)
+        sample_csv, sample_parquet = _sample_files()
         st.download_button(
             label="Download Sample Data (CSV)",
-            data=csv,
+            data=sample_csv,
             file_name="sample_marketing_data.csv",
             mime="text/csv"
         )
+        
+        st.download_button(
+            label="Download Sample Data (Parquet)",
+            data=sample_parquet,
+            file_name="sample_marketing_data.parquet",
+            mime="application/octet-stream",
+            help="Parquet uploads skip CSV parsing and load much faster on large datasets"
+        )
 
 # Footer
 st.markdown("---")
@@ -1,10 +1,19 @@
 import os
+from dataclasses import dataclass
 from dotenv import load_dotenv
 
 load_dotenv()
 
+@dataclass(frozen=True)
 class Config:
-    OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-    OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4-1106-preview')
-    MAX_TOKENS = int(os.getenv('MAX_TOKENS', 1000))
-    TEMPERATURE = float(os.getenv('TEMPERATURE', 0.7))
\ No newline at end of file
+    OPENAI_MODEL: str
+    MAX_TOKENS: int
+    TEMPERATURE: float
+
+# Deployment defaults, read and parsed once at import; callers share this frozen snapshot.
+# The OpenAI API key is not part of it: it can change per session, so callers pass it in
+CONFIG = Config(
+    OPENAI_MODEL=os.getenv('OPENAI_MODEL', 'gpt-4-1106-preview'),
+    MAX_TOKENS=int(os.getenv('MAX_TOKENS', 1000)),
+    TEMPERATURE=float(os.getenv('TEMPERATURE', 0.7))
+)
\ No newline at end of file
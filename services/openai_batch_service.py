@@ -0,0 +1,109 @@
+from services.openai_service import OpenAIService
+import json
+import os
+import time
+
+class OpenAIBatchService:
+    """
+    Non-interactive insight generation through the OpenAI Batch API (half the per-token price,
+    results within the completion window instead of in real time)
+    """
+    ENDPOINT = "/v1/chat/completions"
+
+    def __init__(self, model=None, state_dir=os.path.join(".cache", "openai_batches"), poll_interval=30, api_key=None):
+        self.service = OpenAIService(model, api_key=api_key)
+        self.client = self.service.client
+        self.state_dir = state_dir
+        self.poll_interval = poll_interval
+
+    def generate_insights_batch(self, jobs):
+        """
+        Submit (df, validation_result[, depth]) jobs as one batch, wait for it and
+        return the parsed insights in job order
+        """
+        if not jobs:
+            return []
+        batch_id = self.submit(jobs)
+        return self.collect(batch_id)
+
+    def submit(self, jobs):
+        """Upload the JSONL request file, create the batch and persist its state; returns the batch id"""
+        custom_ids = []
+        lines = []
+        for i, job in enumerate(jobs):
+            df, validation_result, *rest = job
+            data_summary = self.service._prepare_data_summary(df, validation_result)
+            prompt = self.service._build_insight_prompt(data_summary, rest[0] if rest else "Moderate")
+            custom_id = f"job-{i}"
+            custom_ids.append(custom_id)
+            lines.append(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": self.ENDPOINT,
+                "body": self.service._completion_request(prompt)
+            }, default=str))
+
+        input_file = self.client.files.create(
+            file=("insight_batch.jsonl", "\n".join(lines).encode()),
+            purpose="batch"
+        )
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=self.ENDPOINT,
+            completion_window="24h"
+        )
+        self._save_state(batch.id, {
+            "batch_id": batch.id,
+            "input_file_id": input_file.id,
+            "custom_ids": custom_ids,
+            "status": batch.status
+        })
+        return batch.id
+
+    def collect(self, batch_id):
+        """Poll until the batch finishes, then route every response through the insight parser"""
+        state = self._load_state(batch_id)
+
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            if batch.status != state["status"]:
+                state["status"] = batch.status
+                self._save_state(batch_id, state)
+            if batch.status in ("completed", "failed", "expired", "cancelled"):
+                break
+            time.sleep(self.poll_interval)
+
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if response.get("status_code") == 200:
+                    content = response["body"]["choices"][0]["message"]["content"].strip()
+                    results[record["custom_id"]] = self.service._parse_insights(content)
+                else:
+                    error = record.get("error") or response.get("body", {}).get("error")
+                    results[record["custom_id"]] = [f"Error generating insights: {error}"]
+
+        missing = [f"Error generating insights: batch {batch.status} without a result"]
+        return [results.get(custom_id, missing) for custom_id in state["custom_ids"]]
+
+    def _state_path(self, batch_id):
+        return os.path.join(self.state_dir, f"{batch_id}.json")
+
+    def _save_state(self, batch_id, state):
+        """Write-then-rename so an interrupted run never leaves a half-written state file"""
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = self._state_path(batch_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def _load_state(self, batch_id):
+        with open(self._state_path(batch_id)) as f:
+            return json.load(f)
@@ -1,46 +1,210 @@
-import openai
-from config.config import Config
+from config.config import CONFIG
+from utils.data_validation import numeric_columns
 import pandas as pd
 import json
+import os
 import numpy as np
 import re
+import hashlib
+import asyncio
+import weakref
+import threading
+from collections import OrderedDict
+
+try:
+    import h2  # noqa: F401 - httpx only negotiates HTTP/2 when this is installed
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+# Patterns used by _parse_insights, compiled once at import instead of looked up per line
+_MARKDOWN_RE = re.compile(r'\*\*|\*|`')
+_HEADER_RE = re.compile(r'^[A-Z][a-z]+:')
+_BULLET_RE = re.compile(r'^[\d•\-*⁃]+[\s.]*')
+_SENTENCE_RE = re.compile(r'[.!?]+')
+
+# (df.attrs['_version'], metrics) -> (weakref to the frame, summary statistics), least recently used first
+_SUMMARY_STATS = OrderedDict()
+_SUMMARY_STATS_MAXSIZE = 32
+# Streamlit runs each session on its own thread, and the LRU bookkeeping isn't atomic
+_SUMMARY_STATS_LOCK = threading.Lock()
 
 class OpenAIService:
-    def __init__(self):
-        self.client = openai.OpenAI(api_key=Config.OPENAI_API_KEY)
-        self.model = Config.OPENAI_MODEL
+    # Summaries whose statistics all agree within this relative tolerance count as the same data
+    SEMANTIC_RTOL = 0.02
+    
+    def __init__(self, model=None, cache_responses=None, api_key=None):
+        import openai
+        # The key is per caller (each app session enters its own); the environment's is only a default,
+        # read now rather than frozen at import
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
+        # One pooled keep-alive connection set per service, so repeat calls skip the TCP/TLS handshake
+        self.client = openai.OpenAI(
+            api_key=self.api_key,
+            http_client=openai.DefaultHttpxClient(**self._http_client_options())
+        )
+        self.model = model or CONFIG.OPENAI_MODEL
+        self.last_error = None
+        # Only deterministic (temperature 0) completions are reused unless caching is requested explicitly
+        self.cache_responses = CONFIG.TEMPERATURE == 0 if cache_responses is None else cache_responses
+        self._cache = {}
+        self._semantic_cache = {}
     
     def generate_insights(self, df, validation_result, depth="Moderate"):
         """
         Generate insights using OpenAI API
         """
-        # Prepare data summary for the prompt
-        data_summary = self._prepare_data_summary(df, validation_result)
-        
-        prompt = self._build_insight_prompt(data_summary, depth)
+        return list(self.stream_insights(df, validation_result, depth))
+    
+    def stream_insights(self, df, validation_result, depth="Moderate"):
+        """
+        Generate insights using OpenAI API, yielding each one as soon as its line of the
+        response has arrived
+        """
+        prompt, keys, cached = self._prepare_request(df, validation_result, depth)
+        if cached is not None:
+            self.last_error = None
+            yield from cached
+            return
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a marketing data analyst expert. Provide clear, actionable insights based on the data provided."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                max_tokens=Config.MAX_TOKENS,
-                temperature=Config.TEMPERATURE
-            )
+            stream = self.client.chat.completions.create(**self._completion_request(prompt), stream=True)
+            self.last_error = None
+            chunks = []
+            pending = ""
+            streamed = 0
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content or ""
+                chunks.append(delta)
+                *lines, pending = (pending + delta).split("\n")
+                for line in lines:
+                    insight = self._parse_line(line)
+                    if insight:
+                        streamed += 1
+                        yield insight
             
-            insights = response.choices[0].message.content.strip()
-            return self._parse_insights(insights)
+            insights = self._store_insights(keys, "".join(chunks).strip())
+            # The final line has no trailing newline; the fallbacks apply when no line qualified
+            yield from insights[streamed:]
             
         except Exception as e:
-            return [f"Error generating insights: {str(e)}"]
+            self.last_error = e
+            yield f"Error generating insights: {str(e)}"
+    
+    @staticmethod
+    def _http_client_options():
+        """Transport settings shared by the sync and async clients (the SDK's pool limits are kept)"""
+        return {"http2": _HTTP2}
+    
+    def generate_insights_many(self, jobs, max_concurrent_requests=8):
+        """
+        Generate insights for several (df, validation_result, depth) jobs concurrently;
+        results come back in job order
+        """
+        return asyncio.run(self.agenerate_insights_many(jobs, max_concurrent_requests))
+    
+    async def agenerate_insights_many(self, jobs, max_concurrent_requests=8):
+        """Async variant of generate_insights_many for callers that already run an event loop"""
+        import openai
+        semaphore = asyncio.Semaphore(max_concurrent_requests)
+        
+        # The async client's connection pool is bound to the running loop, so it lives only for this batch
+        async with openai.AsyncOpenAI(
+            api_key=self.api_key,
+            http_client=openai.DefaultAsyncHttpxClient(**self._http_client_options())
+        ) as client:
+            async def run(job):
+                df, validation_result, *rest = job
+                prompt, keys, cached = self._prepare_request(df, validation_result, rest[0] if rest else "Moderate")
+                if cached is not None:
+                    return cached
+                try:
+                    async with semaphore:
+                        response = await client.chat.completions.create(**self._completion_request(prompt))
+                    return self._store_insights(keys, response.choices[0].message.content.strip())
+                except Exception as e:
+                    return [f"Error generating insights: {str(e)}"]
+            
+            return await asyncio.gather(*(run(job) for job in jobs))
+    
+    def _prepare_request(self, df, validation_result, depth):
+        """Build the prompt and cache keys, returning any cached insights for it"""
+        # Prepare data summary for the prompt
+        data_summary = self._prepare_data_summary(df, validation_result)
+        
+        prompt = self._build_insight_prompt(data_summary, depth)
+        
+        keys = (self._cache_key(prompt),) + self._summary_signature(data_summary, depth)
+        cached = None
+        if self.cache_responses:
+            cache_key, structure_key, stats_vector = keys
+            cached = self._cache.get(cache_key) or self._semantic_lookup(structure_key, stats_vector)
+        return prompt, keys, (list(cached) if cached is not None else None)
+    
+    def _completion_request(self, prompt):
+        """Chat completion parameters shared by the sync, async and batch paths"""
+        return {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are a marketing data analyst expert. Provide clear, actionable insights based on the data provided."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "max_tokens": CONFIG.MAX_TOKENS,
+            "temperature": CONFIG.TEMPERATURE
+        }
+    
+    def _store_insights(self, keys, insights_text):
+        """Parse a completion and remember it under the request's cache keys"""
+        parsed = self._parse_insights(insights_text)
+        if self.cache_responses:
+            cache_key, structure_key, stats_vector = keys
+            self._cache[cache_key] = parsed
+            self._semantic_store(structure_key, stats_vector, parsed)
+        return list(parsed)
+    
+    def _cache_key(self, prompt):
+        """Stable key for a completion request: model, sampling settings and the full prompt"""
+        raw = f"{self.model}|{CONFIG.TEMPERATURE}|{CONFIG.MAX_TOKENS}|{prompt}"
+        return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+    
+    def _summary_signature(self, data_summary, depth):
+        """Split a summary into an exact structural key and a numeric vector for near-duplicate matching"""
+        metrics = sorted(data_summary['summary_stats'])
+        structure_key = (
+            # Shape must match exactly: stacked copies of a frame have near-identical statistics
+            # but different totals and row counts in the insights
+            self.model, depth, data_summary['data_shape'],
+            tuple(sorted(data_summary['available_metrics'])),
+            tuple(sorted(data_summary['available_dimensions'])),
+            tuple(metrics)
+        )
+        values = [float(data_summary['missing_values'])]
+        for metric in metrics:
+            stats = data_summary['summary_stats'][metric]
+            values.extend(float(stats[k]) for k in ('mean', 'median', 'min', 'max', 'std'))
+        return structure_key, np.array(values)
+    
+    def _semantic_lookup(self, structure_key, stats_vector):
+        """Return cached insights for a summary whose statistics are within SEMANTIC_RTOL of this one"""
+        entry = self._semantic_cache.get(structure_key)
+        if entry is None:
+            return None
+        vectors, results = entry
+        close = np.abs(vectors - stats_vector) <= 1e-9 + self.SEMANTIC_RTOL * np.abs(stats_vector)
+        hits = np.flatnonzero(close.all(axis=1))
+        return results[hits[0]] if hits.size else None
+    
+    def _semantic_store(self, structure_key, stats_vector, insights):
+        vectors, results = self._semantic_cache.get(structure_key, (np.empty((0, stats_vector.size)), []))
+        self._semantic_cache[structure_key] = (np.vstack([vectors, stats_vector]), results + [insights])
     
     def _prepare_data_summary(self, df, validation_result):
         """Prepare a summary of the data for the prompt"""
@@ -49,30 +213,43 @@ class OpenAIService:
             "available_metrics": validation_result["available_metrics"],
             "available_dimensions": validation_result["available_dimensions"],
             "missing_values": validation_result["missing_values"],
-            "sample_data": df.head(10).to_dict('records'),
+            # Only the slice the prompt shows: first 3 rows of the first 5 columns
+            "sample_data": df.head(3).iloc[:, :5].to_dict('records'),
             "summary_stats": self._get_summary_statistics(df, validation_result["available_metrics"])
         }
         return summary
     
     def _get_summary_statistics(self, df, available_metrics):
         """Get summary statistics for numeric columns"""
-        stats = {}
-        numeric_cols = df.select_dtypes(include=[np.number]).columns
-        
-        for col in numeric_cols:
-            if col in available_metrics:
-                stats[col] = {
-                    "mean": df[col].mean(),
-                    "median": df[col].median(),
-                    "min": df[col].min(),
-                    "max": df[col].max(),
-                    "std": df[col].std()
-                }
-        return stats
+        version = df.attrs.get('_version')
+        key = (version, tuple(sorted(available_metrics)))
+        entry = None
+        if version is not None:
+            with _SUMMARY_STATS_LOCK:
+                entry = _SUMMARY_STATS.get(key)
+                if entry is not None:
+                    _SUMMARY_STATS.move_to_end(key)
+        # attrs are inherited by frames derived from this one, so the entry must belong to this exact object
+        if entry is not None and entry[0]() is df:
+            stats = entry[1]
+        else:
+            numeric_cols = [col for col in numeric_columns(df) if col in available_metrics]
+            if not numeric_cols:
+                return {}
+            
+            # One DataFrame-level aggregation instead of five separate reductions per column
+            stats = df[numeric_cols].agg(['mean', 'median', 'min', 'max', 'std']).to_dict()
+            if version is not None:
+                with _SUMMARY_STATS_LOCK:
+                    _SUMMARY_STATS[key] = (weakref.ref(df), stats)
+                    if len(_SUMMARY_STATS) > _SUMMARY_STATS_MAXSIZE:
+                        _SUMMARY_STATS.popitem(last=False)
+        return {metric: dict(values) for metric, values in stats.items()}
     
     def _build_insight_prompt(self, data_summary, depth):
         """Build the prompt for OpenAI API without JSON serialization"""
-        prompt = f"""
+        # Pieces are collected and joined once rather than re-copying the prompt on every +=
+        parts = [f"""
         Analyze this marketing data and provide {depth.lower()} insights:
         
         DATA OVERVIEW:
@@ -82,28 +259,28 @@ class OpenAIService:
         - Missing values: {data_summary['missing_values']}
         
         SUMMARY STATISTICS:
-        """
+        """]
         
         # Add summary statistics in a readable format
         for metric, stats in data_summary['summary_stats'].items():
-            prompt += f"\n- {metric}: mean={stats['mean']:.2f}, min={stats['min']:.2f}, max={stats['max']:.2f}"
+            parts.append(f"\n- {metric}: mean={stats['mean']:.2f}, min={stats['min']:.2f}, max={stats['max']:.2f}")
         
-        prompt += f"""
+        parts.append("""
         
         SAMPLE DATA (first few rows):
-        """
+        """)
         
         # Add sample data in a readable format
         for i, row in enumerate(data_summary['sample_data'][:3]):  # First 3 rows only
-            prompt += f"\nRow {i+1}: "
+            fields = []
             for key, value in list(row.items())[:5]:  # First 5 columns only
                 if isinstance(value, (int, float)):
-                    prompt += f"{key}={value:.2f}, "
+                    fields.append(f"{key}={value:.2f}")
                 else:
-                    prompt += f"{key}='{value}', "
-            prompt = prompt.rstrip(', ') + ";"
+                    fields.append(f"{key}='{value}'")
+            parts.append(f"\nRow {i+1}: {', '.join(fields)}".rstrip(', ') + ";")
         
-        prompt += """
+        parts.append("""
         
         Please provide:
         1. Key performance insights with specific numbers and percentages
@@ -114,46 +291,30 @@ class OpenAIService:
         
         Format the response as a clear, structured list of insights.
         Focus on marketing performance metrics like ROI, CPA, CTR, and conversion rates.
-        """
+        """)
         
-        return prompt
+        return "".join(parts)
     
     def _parse_insights(self, insights_text):
         """Parse the insights text into a list"""
-        import re
-        
         # If the response is already a list format, split it properly
         insights = []
         
         # Remove any markdown formatting
-        insights_text = re.sub(r'\*\*|\*|`', '', insights_text)
+        insights_text = _MARKDOWN_RE.sub('', insights_text)
         
         # Split by various list indicators
-        lines = insights_text.split('\n')
+        lines = insights_text.splitlines()
         
         for line in lines:
-            line = line.strip()
-            
-            # Skip empty lines and section headers
-            if not line or line.lower().startswith(('key insights', 'recommendations', 'conclusion')):
-                continue
-                
-            # Check if this looks like an insight (not too short, not a header)
-            if (len(line) > 20 and 
-                not line.endswith(':') and 
-                not line.isupper() and  # Skip all-caps headers
-                not re.match(r'^[A-Z][a-z]+:', line)):  # Skip "Recommendation:" type lines
-                
-                # Clean up numbering and bullets
-                line = re.sub(r'^[\d•\-*⁃]+[\s.]*', '', line).strip()
-                
-                if line and len(line) > 10:  # Minimum length for meaningful insight
-                    insights.append(line)
+            insight = self._parse_line(line)
+            if insight:
+                insights.append(insight)
         
         # If no insights were parsed, return the original text as a single insight
         if not insights:
             # Split into sentences for better formatting
-            sentences = re.split(r'[.!?]+', insights_text)
+            sentences = _SENTENCE_RE.split(insights_text)
             insights = [s.strip() for s in sentences if len(s.strip()) > 20]
         
         # If still no insights, return the first few meaningful lines
@@ -161,4 +322,25 @@ class OpenAIService:
             meaningful_lines = [line.strip() for line in lines if len(line.strip()) > 30]
             insights = meaningful_lines[:5]  # Return first 5 meaningful lines
         
-        return insights
\ No newline at end of file
+        return insights
+    
+    def _parse_line(self, line):
+        """Return the cleaned insight on one line of the response, or None if it isn't one"""
+        line = _MARKDOWN_RE.sub('', line).strip()
+        
+        # Skip empty lines and section headers
+        if not line or line.lower().startswith(('key insights', 'recommendations', 'conclusion')):
+            return None
+            
+        # Check if this looks like an insight (not too short, not a header)
+        if (len(line) > 20 and 
+            not line.endswith(':') and 
+            not line.isupper() and  # Skip all-caps headers
+            not _HEADER_RE.match(line)):  # Skip "Recommendation:" type lines
+            
+            # Clean up numbering and bullets
+            line = _BULLET_RE.sub('', line).strip()
+            
+            if line and len(line) > 10:  # Minimum length for meaningful insight
+                return line
+        return None
@@ -0,0 +1,27 @@
+import pandas as pd
+import weakref
+
+# Below this size pandas' Cython groupby is already fast and a numba JIT would not pay off
+NUMBA_MIN_ROWS = 100_000
+
+# id(df) -> (columns Index the entries were computed for, {(time_col, metric, freq): sums})
+_PERIOD_SUMS = {}
+
+def weekly_sum(df, time_col, metric, freq='W'):
+    """
+    Sum a metric per calendar period, computed once per DataFrame so the basic insights
+    and the time-series chart share the same aggregation
+    """
+    key = id(df)
+    entry = _PERIOD_SUMS.get(key)
+    # Adding, dropping or renaming columns replaces df.columns, which invalidates the entries
+    if entry is None or entry[0] is not df.columns:
+        if entry is None:
+            weakref.finalize(df, _PERIOD_SUMS.pop, key, None)
+        entry = (df.columns, {})
+        _PERIOD_SUMS[key] = entry
+    sums = entry[1].get((time_col, metric, freq))
+    if sums is None:
+        sums = df.groupby(pd.Grouper(key=time_col, freq=freq))[metric].sum()
+        entry[1][(time_col, metric, freq)] = sums
+    return sums
@@ -1,7 +1,59 @@
 import pandas as pd
 import numpy as np
 import re
+import weakref
+import uuid
+from functools import lru_cache
+from pandas.api.types import is_string_dtype
 from datetime import datetime
+from utils.aggregations import NUMBA_MIN_ROWS
+
+# Patterns for required metrics and dimensions
+METRIC_PATTERNS = {
+    'spend': r'spend|cost|investment|budget',
+    'cost': r'cost|expense|expenditure',
+    'cpc': r'cpc|costperclick|cost_per_click',
+    'ctr': r'ctr|clickthroughrate|click_through_rate',
+    'roi': r'roi|returnoninvestment|return_on_investment',
+    'transactions': r'transaction|purchase|sale',
+    'conversions': r'conversion|convert',
+    'revenue': r'revenue|income|sales'
+}
+
+DIMENSION_PATTERNS = {
+    'date': r'date|time|day|week|month|year',
+    'campaign': r'campaign|promo|promotion|initiative',
+    'source': r'source|origin|trafficsource|traffic_source',
+    'medium': r'medium|channel|type',
+    'city': r'city|town|metro',
+    'state': r'state|province|region',
+    'age': r'age|yearold|years',
+    'gender': r'gender|sex',
+    'device': r'device|platform|hardware',
+    'browser': r'browser|useragent|user_agent'
+}
+
+# Compiled once; metrics are matched (and renamed) before dimensions
+_COLUMN_PATTERNS = (
+    [('metric', name, re.compile(pattern, re.IGNORECASE)) for name, pattern in METRIC_PATTERNS.items()] +
+    [('dimension', name, re.compile(pattern, re.IGNORECASE)) for name, pattern in DIMENSION_PATTERNS.items()]
+)
+
+# Date formats recognised inside free-text date values, in order of preference
+DATE_PATTERNS = [
+    r'\d{4}-\d{2}-\d{2}',  # YYYY-MM-DD
+    r'\d{2}/\d{2}/\d{4}',   # MM/DD/YYYY
+    r'\d{2}-\d{2}-\d{4}',   # MM-DD-YYYY
+    r'\d{4}/\d{2}/\d{2}',   # YYYY/MM/DD
+    r'\d{1,2} [A-Za-z]{3} \d{4}',  # 01 Jan 2023
+    r'[A-Za-z]{3} \d{1,2}, \d{4}',  # Jan 01, 2023
+]
+
+# All formats as one capturing alternation, so a whole column is scanned in a single pass
+_DATE_ALT = re.compile('(' + '|'.join(DATE_PATTERNS) + ')')
+
+# id(df) -> (columns Index the entry was computed for, numeric column names)
+_NUMERIC_COLS = {}
 
 def validate_data_structure(df):
     """
@@ -10,56 +62,40 @@ def validate_data_structure(df):
     # Normalize column names (lowercase and remove special characters)
     df.columns = [re.sub(r'[^a-zA-Z0-9]', '', col.lower()) for col in df.columns]
     
-    # Define patterns for required metrics and dimensions
-    metric_patterns = {
-        'spend': r'spend|cost|investment|budget',
-        'cost': r'cost|expense|expenditure',
-        'cpc': r'cpc|costperclick|cost_per_click',
-        'ctr': r'ctr|clickthroughrate|click_through_rate',
-        'roi': r'roi|returnoninvestment|return_on_investment',
-        'transactions': r'transaction|purchase|sale',
-        'conversions': r'conversion|convert',
-        'revenue': r'revenue|income|sales'
-    }
-    
-    dimension_patterns = {
-        'date': r'date|time|day|week|month|year',
-        'campaign': r'campaign|promo|promotion|initiative',
-        'source': r'source|origin|trafficsource|traffic_source',
-        'medium': r'medium|channel|type',
-        'city': r'city|town|metro',
-        'state': r'state|province|region',
-        'age': r'age|yearold|years',
-        'gender': r'gender|sex',
-        'device': r'device|platform|hardware',
-        'browser': r'browser|useragent|user_agent'
-    }
-    
-    # Find matching columns for each pattern
-    available_metrics = []
-    for metric_name, pattern in metric_patterns.items():
-        matching_cols = [col for col in df.columns if re.search(pattern, col, re.IGNORECASE)]
-        if matching_cols:
-            available_metrics.append(metric_name)
-            # Rename the first matching column to standard name for easier processing
-            if metric_name not in df.columns and matching_cols:
-                df = df.rename(columns={matching_cols[0]: metric_name})
-    
-    available_dimensions = []
-    for dimension_name, pattern in dimension_patterns.items():
-        matching_cols = [col for col in df.columns if re.search(pattern, col, re.IGNORECASE)]
-        if matching_cols:
-            available_dimensions.append(dimension_name)
+    # Find the first matching column for each pattern (renames are tracked on a plain list and applied once)
+    columns = list(df.columns)
+    found = {'metric': [], 'dimension': []}
+    for kind, name, regex in _COLUMN_PATTERNS:
+        match = next((col for col in columns if regex.search(col)), None)
+        if match is not None:
+            found[kind].append(name)
             # Rename the first matching column to standard name for easier processing
-            if dimension_name not in df.columns and matching_cols:
-                df = df.rename(columns={matching_cols[0]: dimension_name})
+            if name not in columns:
+                columns[columns.index(match)] = name
+    available_metrics = found['metric']
+    available_dimensions = found['dimension']
+    
+    df.columns = columns
     
     # Check data types and convert date if needed
     if 'date' in df.columns:
         df = convert_date_column(df, 'date')
     
-    # Check for missing values
-    missing_values = df.isnull().sum().sum()
+    # Low-cardinality text dimensions group on integer codes instead of hashing strings
+    for dimension in available_dimensions:
+        values = df[dimension]
+        if is_string_dtype(values) and values.nunique() < 0.5 * len(df):
+            df[dimension] = values.astype('category')
+    
+    # Narrower integer dtypes cut the bytes moved by every sum, corr and chart conversion downstream
+    df = optimize_dtypes(df)
+    
+    # Check for missing values (one vectorized reduction over the whole frame)
+    null_counts = df.isna().sum()
+    missing_values = int(null_counts.sum())
+    
+    # Tag this validated frame so derived results can be cached against it
+    df.attrs['_version'] = uuid.uuid4().hex
     
     # UPDATED: Only require 1 metric and 1 dimension (was 3 metrics and 2 dimensions)
     validation_result = {
@@ -79,21 +115,22 @@ def convert_date_column(df, date_col):
     Convert date column to datetime format with multiple fallback strategies
     """
     if date_col in df.columns:
-        # Try multiple date parsing strategies
+        raw = df[date_col]
         try:
-            # First try direct conversion
-            df[date_col] = pd.to_datetime(df[date_col])
-        except:
-            try:
-                # Try with different date formats
-                df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-            except:
-                try:
-                    # Try inferring datetime format
-                    df[date_col] = pd.to_datetime(df[date_col], infer_datetime_format=True)
-                except:
-                    # If all fails, try to extract dates from strings
-                    df[date_col] = df[date_col].apply(extract_date_from_string)
+            # One coercing parse with a single format inferred for the whole column; entries in
+            # any other format become NaT instead of raising
+            parsed = pd.to_datetime(raw, errors='coerce')
+            failed = (parsed.isna() & raw.notna()).sum()
+            if failed:
+                # An ambiguous first value ('05/01/2023') is read month-first; when a day-first
+                # format fits more rows, the whole column is day-first
+                dayfirst = pd.to_datetime(raw, errors='coerce', dayfirst=True)
+                if (dayfirst.isna() & raw.notna()).sum() < failed:
+                    parsed = dayfirst
+        except (ValueError, TypeError):
+            # e.g. mixed UTC offsets, which to_datetime refuses even with errors='coerce'
+            parsed = extract_dates(raw)
+        df[date_col] = parsed
         
         # Drop rows where date conversion failed
         original_count = len(df)
@@ -105,6 +142,37 @@ def convert_date_column(df, date_col):
     
     return df
 
+def numeric_columns(df):
+    """
+    Numeric column names of df, computed once per DataFrame and reused across callers
+    """
+    key = id(df)
+    entry = _NUMERIC_COLS.get(key)
+    # Adding, dropping or renaming columns replaces df.columns, which invalidates the entry
+    if entry is None or entry[0] is not df.columns:
+        if entry is None:
+            weakref.finalize(df, _NUMERIC_COLS.pop, key, None)
+        entry = (df.columns, df.select_dtypes(include=[np.number]).columns.tolist())
+        _NUMERIC_COLS[key] = entry
+    return entry[1]
+
+def optimize_dtypes(df):
+    """
+    Downcast integer columns to the smallest dtype that holds their values
+    """
+    # Integers downcast losslessly; float metrics (spend, revenue, ...) stay float64 because
+    # float32 totals drift by whole dollars once a few hundred thousand rows are summed
+    for col in df.select_dtypes('integer').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+def extract_dates(values):
+    """
+    Extract dates from a Series of free-text values in one vectorized pass
+    """
+    found = values.astype(str).str.extract(_DATE_ALT, expand=False)
+    return pd.to_datetime(found, errors='coerce', format='mixed')
+
 def extract_date_from_string(date_str):
     """
     Extract date from various string formats
@@ -112,17 +180,7 @@ def extract_date_from_string(date_str):
     if pd.isna(date_str) or date_str == '':
         return pd.NaT
     
-    # Common date patterns
-    date_patterns = [
-        r'\d{4}-\d{2}-\d{2}',  # YYYY-MM-DD
-        r'\d{2}/\d{2}/\d{4}',   # MM/DD/YYYY
-        r'\d{2}-\d{2}-\d{4}',   # MM-DD-YYYY
-        r'\d{4}/\d{2}/\d{2}',   # YYYY/MM/DD
-        r'\d{1,2} [A-Za-z]{3} \d{4}',  # 01 Jan 2023
-        r'[A-Za-z]{3} \d{1,2}, \d{4}',  # Jan 01, 2023
-    ]
-    
-    for pattern in date_patterns:
+    for pattern in DATE_PATTERNS:
         match = re.search(pattern, str(date_str))
         if match:
             try:
@@ -132,30 +190,69 @@ def extract_date_from_string(date_str):
     
     return pd.NaT
 
-def generate_sample_data():
+@lru_cache(maxsize=None)
+def _derive_metrics_kernel():
+    # numba is imported on first large input only, so importing this module stays cheap
+    try:
+        from numba import njit, prange
+    except ImportError:
+        return None
+    
+    # error_model='numpy' keeps NumPy's inf/nan on zero denominators; no fastmath so NaNs propagate
+    @njit(parallel=True, cache=True, error_model='numpy')
+    def kernel(spend, clicks, impressions, revenue, cpc, ctr, roi):
+        for i in prange(spend.size):
+            s = spend[i]
+            c = clicks[i]
+            cpc[i] = s / c
+            ctr[i] = c / impressions[i]
+            roi[i] = (revenue[i] - s) / s
+    return kernel
+
+def _derive_metrics(spend, clicks, impressions, revenue):
+    """
+    Compute cpc, ctr and roi from raw arrays, fused into one parallel pass for large inputs
+    """
+    kernel = _derive_metrics_kernel() if spend.size >= NUMBA_MIN_ROWS else None
+    if kernel is None:
+        return spend / clicks, clicks / impressions, (revenue - spend) / spend
+    spend, clicks, impressions, revenue = (
+        np.asarray(a, dtype=np.float64) for a in (spend, clicks, impressions, revenue)
+    )
+    cpc, ctr, roi = np.empty_like(spend), np.empty_like(spend), np.empty_like(spend)
+    kernel(spend, clicks, impressions, revenue, cpc, ctr, roi)
+    return cpc, ctr, roi
+
+def generate_sample_data(n=500, seed=0):
     """
     Generate sample marketing data for testing with proper datetime format
     """
+    # Callers rename and convert columns in place, so each one gets its own copy
+    return _sample_data(n, seed).copy()
+
+@lru_cache(maxsize=8)
+def _sample_data(n, seed):
+    rng = np.random.default_rng(seed)
     dates = pd.date_range(start='2023-01-01', end='2023-12-31', freq='D')
     campaigns = ['Spring_Sale', 'Summer_Promo', 'Fall_Campaign', 'Winter_Offer']
     sources = ['Google', 'Facebook', 'Instagram', 'Twitter', 'Email']
     mediums = ['CPC', 'Social', 'Organic', 'Display']
     
     data = {
-        'date': np.random.choice(dates, 500),
-        'campaign': np.random.choice(campaigns, 500),
-        'source': np.random.choice(sources, 500),
-        'medium': np.random.choice(mediums, 500),
-        'spend': np.random.uniform(50, 2000, 500),
-        'impressions': np.random.randint(1000, 50000, 500),
-        'clicks': np.random.randint(10, 500, 500),
-        'conversions': np.random.randint(0, 50, 500),
-        'revenue': np.random.uniform(0, 5000, 500),
+        'date': rng.choice(dates.values, n),
+        'campaign': rng.choice(campaigns, n),
+        'source': rng.choice(sources, n),
+        'medium': rng.choice(mediums, n),
+        'spend': rng.uniform(50, 2000, n),
+        'impressions': rng.integers(1000, 50000, n),
+        'clicks': rng.integers(10, 500, n),
+        'conversions': rng.integers(0, 50, n),
+        'revenue': rng.uniform(0, 5000, n),
     }
     
-    data['cpc'] = data['spend'] / data['clicks']
-    data['ctr'] = data['clicks'] / data['impressions']
-    data['roi'] = (data['revenue'] - data['spend']) / data['spend']
+    data['cpc'], data['ctr'], data['roi'] = _derive_metrics(
+        data['spend'], data['clicks'], data['impressions'], data['revenue']
+    )
     
     df = pd.DataFrame(data)
     
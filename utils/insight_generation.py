@@ -1,5 +1,6 @@
 import pandas as pd
-import numpy as np
+from utils.data_validation import numeric_columns
+from utils.aggregations import weekly_sum
 
 def generate_basic_insights(df, validation_result, depth="Moderate"):
     """
@@ -38,7 +39,7 @@ def generate_basic_insights(df, validation_result, depth="Moderate"):
         # Use the first available metric for time analysis
         if available_metrics:
             metric = available_metrics[0]
-            time_grouped = df.groupby(pd.Grouper(key=time_col, freq='W'))[metric].sum().reset_index()
+            time_grouped = weekly_sum(df, time_col, metric).reset_index()
             if not time_grouped.empty:
                 max_period = time_grouped.loc[time_grouped[metric].idxmax()]
                 insights.append(f"Highest {metric} week: {max_period[time_col].strftime('%Y-%m-%d')} with {max_period[metric]:,.2f}")
@@ -48,8 +49,8 @@ def generate_basic_insights(df, validation_result, depth="Moderate"):
         first_dimension = available_dimensions[0]
         if available_metrics:
             first_metric = available_metrics[0]
-            dimension_grouped = df.groupby(first_dimension)[first_metric].sum().reset_index()
-            dimension_grouped = dimension_grouped.sort_values(first_metric, ascending=False)
+            # Only the leader is reported, so pick it without sorting every group
+            dimension_grouped = df.groupby(first_dimension, observed=True)[first_metric].sum().nlargest(1).reset_index()
             
             if not dimension_grouped.empty:
                 top_item = dimension_grouped.iloc[0]
@@ -57,7 +58,7 @@ def generate_basic_insights(df, validation_result, depth="Moderate"):
     
     # 5. Simple correlations (if we have multiple metrics)
     if len(available_metrics) >= 2:
-        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+        numeric_cols = numeric_columns(df)
         if len(numeric_cols) > 1:
             # Simple correlation check between first two metrics
             if available_metrics[0] in numeric_cols and available_metrics[1] in numeric_cols:
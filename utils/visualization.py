@@ -2,6 +2,41 @@ import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
+from functools import lru_cache
+from utils.data_validation import numeric_columns
+from utils.aggregations import NUMBA_MIN_ROWS, weekly_sum
+
+# Line charts with more points than this are drawn with WebGL instead of SVG
+_WEBGL_MIN_POINTS = 2000
+
+@lru_cache(maxsize=None)
+def _grouped_sum_kernel():
+    # numba is imported on first large input only, so importing this module stays cheap
+    try:
+        from numba import njit, prange, get_num_threads
+    except ImportError:
+        return None
+    
+    # n_chunks is an argument, not a get_num_threads() call inside the kernel, so numba can cache it
+    @njit(parallel=True, cache=True)
+    def kernel(codes, values, n_groups, n_chunks):
+        # One partial row per thread so parallel chunks never write to the same slot
+        chunk = (codes.size + n_chunks - 1) // n_chunks
+        partial = np.zeros((n_chunks, n_groups))
+        for c in prange(n_chunks):
+            for i in range(c * chunk, min((c + 1) * chunk, codes.size)):
+                v = values[i]
+                if codes[i] >= 0 and v == v:
+                    partial[c, codes[i]] += v
+        return partial.sum(axis=0)
+    
+    def grouped_sum(codes, values, n_groups):
+        return kernel(codes, values, n_groups, get_num_threads())
+    return grouped_sum
+
+def _line_render_mode(points):
+    # SVG keeps small charts crisp and interactive; long series render far faster on a WebGL canvas
+    return 'webgl' if len(points) > _WEBGL_MIN_POINTS else 'svg'
 
 def create_time_series_plot(df, time_col, metric):
     """
@@ -15,12 +50,13 @@ def create_time_series_plot(df, time_col, metric):
     
     # Group by week for better visualization
     try:
-        time_grouped = df.groupby(pd.Grouper(key=time_col, freq='W'))[metric].sum().reset_index()
+        time_grouped = weekly_sum(df, time_col, metric).reset_index()
         time_grouped = time_grouped.sort_values(time_col)
         
         fig = px.line(time_grouped, x=time_col, y=metric, 
                      title=f"{metric.title()} Over Time (Weekly Aggregation)",
-                     labels={time_col: 'Date', metric: metric.title()})
+                     labels={time_col: 'Date', metric: metric.title()},
+                     render_mode=_line_render_mode(time_grouped))
         
         fig.update_layout(
             xaxis_title="Date",
@@ -37,7 +73,8 @@ def create_time_series_plot(df, time_col, metric):
         
         fig = px.line(time_grouped, x=time_col, y=metric, 
                      title=f"{metric.title()} Over Time (Daily)",
-                     labels={time_col: 'Date', metric: metric.title()})
+                     labels={time_col: 'Date', metric: metric.title()},
+                     render_mode=_line_render_mode(time_grouped))
         
         fig.update_layout(
             xaxis_title="Date",
@@ -47,14 +84,34 @@ def create_time_series_plot(df, time_col, metric):
         
         return fig
 
+def aggregate_top_n(df, group_cols, metric, top_n=10):
+    """
+    Sum a metric per group and keep the top N groups
+    """
+    kernel = _grouped_sum_kernel() if isinstance(group_cols, str) and len(df) >= NUMBA_MIN_ROWS else None
+    if kernel is not None:
+        codes, uniques = pd.factorize(df[group_cols], sort=False)
+        values = df[metric].to_numpy(dtype=np.float64, na_value=np.nan)
+        sums = kernel(codes, values, len(uniques))
+        if pd.api.types.is_integer_dtype(df[metric].dtype):
+            sums = sums.astype(np.int64)
+        grouped = pd.Series(sums, index=pd.Index(uniques, name=group_cols), name=metric)
+        return grouped.nlargest(top_n).reset_index()
+    
+    # observed=True keeps category dimensions from expanding to every category combination
+    grouped = df.groupby(group_cols, observed=True, sort=False)[metric].sum()
+    return grouped.nlargest(top_n).reset_index()
+
 def create_campaign_bar_plot(df, campaign_col, metric):
     """
     Create a bar plot for campaign performance (top 10 only)
     """
-    # Get top 10 campaigns by the selected metric
-    campaign_grouped = df.groupby(campaign_col)[metric].sum().reset_index()
-    campaign_grouped = campaign_grouped.sort_values(metric, ascending=False).head(10)
-    
+    return plot_campaign_bar(aggregate_top_n(df, campaign_col, metric, 10), campaign_col, metric)
+
+def plot_campaign_bar(campaign_grouped, campaign_col, metric):
+    """
+    Render the campaign bar plot from pre-aggregated top campaigns
+    """
     # Use color scale based on metric value
     fig = px.bar(campaign_grouped, x=campaign_col, y=metric,
                 title=f"Top 10 Campaigns by {metric.title()}",
@@ -75,10 +132,14 @@ def create_channel_pie_chart(df, metric):
     """
     Create a pie chart for channel performance (top 10 channels)
     """
-    # Group by source and medium, get top 10
-    channel_grouped = df.groupby(['source', 'medium'])[metric].sum().reset_index()
-    channel_grouped = channel_grouped.sort_values(metric, ascending=False).head(10)
-    channel_grouped['channel'] = channel_grouped['source'] + ' - ' + channel_grouped['medium']
+    return plot_channel_pie(aggregate_top_n(df, ['source', 'medium'], metric, 10), metric)
+
+def plot_channel_pie(channel_grouped, metric):
+    """
+    Render the channel pie chart from pre-aggregated top source/medium pairs
+    """
+    channel_grouped = channel_grouped.copy()
+    channel_grouped['channel'] = channel_grouped['source'].astype(str) + ' - ' + channel_grouped['medium'].astype(str)
     
     # Create donut chart for better visualization
     fig = px.pie(channel_grouped, values=metric, names='channel',
@@ -90,15 +151,35 @@ def create_channel_pie_chart(df, metric):
     
     return fig
 
+def compute_correlation_matrix(df):
+    """
+    Pearson correlation of numeric columns in a single BLAS pass
+    """
+    numeric_cols = numeric_columns(df)
+    if len(numeric_cols) < 2:
+        return None
+    
+    X = df[numeric_cols].to_numpy(dtype=np.float32, na_value=np.nan)
+    if np.isnan(X).any():
+        # Pairwise-complete correlation is needed when values are missing
+        return df[numeric_cols].corr()
+    
+    # dtype keeps corrcoef on the float32 (SGEMM) path; constant columns come out NaN, as in pandas
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = np.corrcoef(X, rowvar=False, dtype=np.float32)
+    return pd.DataFrame(corr, index=numeric_cols, columns=numeric_cols)
+
 def create_correlation_heatmap(df):
     """
     Create a correlation heatmap for numeric columns
     """
-    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-    if len(numeric_cols) > 1:
-        # Calculate correlation matrix
-        corr_matrix = df[numeric_cols].corr()
-        
+    return plot_correlation_heatmap(compute_correlation_matrix(df))
+
+def plot_correlation_heatmap(corr_matrix):
+    """
+    Render the correlation heatmap from a precomputed correlation matrix
+    """
+    if corr_matrix is not None:
         # Create heatmap
         fig = px.imshow(corr_matrix, 
                        title="Correlation Matrix of Metrics",
@@ -119,10 +200,13 @@ def create_top_performers_chart(df, dimension_col, metric_col, chart_type='bar',
     """
     Generic function to create charts for top performers
     """
-    # Group and get top N
-    grouped = df.groupby(dimension_col)[metric_col].sum().reset_index()
-    grouped = grouped.sort_values(metric_col, ascending=False).head(top_n)
-    
+    grouped = aggregate_top_n(df, dimension_col, metric_col, top_n)
+    return plot_top_performers(grouped, dimension_col, metric_col, chart_type, top_n)
+
+def plot_top_performers(grouped, dimension_col, metric_col, chart_type='bar', top_n=10):
+    """
+    Render the top performers chart from pre-aggregated groups
+    """
     if chart_type == 'bar':
         fig = px.bar(grouped, x=dimension_col, y=metric_col,
                     title=f"Top {top_n} {dimension_col.title()} by {metric_col.title()}",